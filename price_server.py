@@ -1,12 +1,21 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, stream_template, url_for, g, has_request_context
 import json
 import csv
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import quote
 import io
 import pandas as pd
 import shutil
 import zipfile
+import threading
+import atexit
+import itertools
+import re
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from io import BytesIO
 from flask import send_file
 
@@ -26,6 +35,44 @@ STATUS_FILE = os.path.join(DATA_DIR, 'quotation_status.json')
 ANALYTICS_FILE = os.path.join(DATA_DIR, 'analytics.json')
 DELETIONS_FILE = os.path.join(DATA_DIR, 'deleted_quotes.json')
 CATEGORIES_FILE = os.path.join(DATA_DIR, 'categories.json')
+PRICES_ARCHIVE_DIR = os.path.join(DATA_DIR, 'product_prices_archive')
+
+# Price history retention: entries newer than HISTORY_RECENT_DAYS are kept at
+# full resolution (at most HISTORY_MAX_RECENT of them), older ones are folded
+# into daily buckets, and anything older than HISTORY_DAILY_DAYS into weekly
+# buckets. Raw entries that leave the recent window are appended to one
+# JSON Lines file per product in PRICES_ARCHIVE_DIR, read only on demand.
+HISTORY_RECENT_DAYS = int(os.environ.get('HISTORY_RECENT_DAYS', 30))
+HISTORY_MAX_RECENT = int(os.environ.get('HISTORY_MAX_RECENT', 100))
+HISTORY_DAILY_DAYS = int(os.environ.get('HISTORY_DAILY_DAYS', 180))
+HISTORY_MAX_COMPACTED = int(os.environ.get('HISTORY_MAX_COMPACTED', 104))
+HISTORY_DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+# /debug shows one page per section; ?limit= can raise the page size up to
+# DEBUG_MAX_PAGE_SIZE. Only the newest DEBUG_HISTORY_ENTRIES price history
+# entries are rendered per product.
+DEBUG_PAGE_SIZE = 25
+DEBUG_MAX_PAGE_SIZE = 200
+DEBUG_HISTORY_ENTRIES = 10
+
+# Single-price updates are queued and written in batches: the queue is flushed
+# every PRICE_WRITE_WINDOW_SECONDS, or sooner once PRICE_WRITE_BATCH_SIZE
+# products are pending.
+PRICE_WRITE_WINDOW_SECONDS = float(os.environ.get('PRICE_WRITE_WINDOW_SECONDS', 0.5))
+PRICE_WRITE_BATCH_SIZE = int(os.environ.get('PRICE_WRITE_BATCH_SIZE', 500))
+
+# Multi-tenant storage: a tenant ID from the X-Tenant-ID header or a /t/<id>/
+# URL prefix selects TENANTS_DIR/<id> instead of DATA_DIR. A tenant exists once
+# its directory has been created there by an operator. Parsed files of all
+# tenants share one LRU cache of at most CACHE_BUDGET_BYTES (estimated memory of
+# the parsed objects), and tenants idle for TENANT_IDLE_SECONDS are dropped from
+# memory.
+TENANT_HEADER = 'X-Tenant-ID'
+TENANTS_DIR = os.path.join(DATA_DIR, 'tenants')
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+CACHE_BUDGET_BYTES = int(os.environ.get('CACHE_BUDGET_BYTES', 64 * 1024 * 1024))
+TENANT_IDLE_SECONDS = int(os.environ.get('TENANT_IDLE_SECONDS', 15 * 60))
+TENANT_SWEEP_SECONDS = 60
 
 
 
@@ -33,8 +80,17 @@ CATEGORIES_FILE = os.path.join(DATA_DIR, 'categories.json')
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+def tenant_data_dir(tenant_id=None):
+    """Return the data directory of the given tenant, or of the current request's tenant"""
+    if tenant_id is None and has_request_context():
+        tenant_id = g.get('tenant_id')
+    if not tenant_id:
+        return DATA_DIR
+    return os.path.join(TENANTS_DIR, tenant_id)
+
 def get_file_path(filename):
-    return os.path.join(DATA_DIR, filename)
+    """Resolve a data file (e.g. PRICES_FILE) inside the current tenant's directory"""
+    return os.path.join(tenant_data_dir(), os.path.basename(filename))
 
 # Add new file type handling function
 def handle_json_file(file_name, data=None):
@@ -52,14 +108,444 @@ def handle_json_file(file_name, data=None):
             
         with open(file_path, 'w') as f:
             json.dump(data, f, indent=2)
+        json_cache.invalidate(file_path)
     else:  # GET request
         if not os.path.exists(file_path):
             with open(file_path, 'w') as f:
                 json.dump({}, f)
+            json_cache.invalidate(file_path)
             return {}
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        return load_json_cached(file_path, {})
+
+
+def estimate_memory_size(data):
+    """Estimate the memory used by parsed JSON data (containers, keys and values)"""
+    total = 0
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return total
+
+
+class JsonCache:
+    """LRU cache of parsed JSON files shared by every tenant under one memory budget"""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()  # path -> (signature, size, data)
+        self._size = 0
+        # Bumped on every write, so a load that raced with a write is not cached
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, file_path):
+        with self._lock:
+            return self._generations.get(file_path, 0)
+
+    def get(self, file_path, signature):
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is None or entry[0] != signature:
+                return None
+            self._entries.move_to_end(file_path)
+            return entry[2]
+
+    def put(self, file_path, signature, size, data, generation):
+        with self._lock:
+            self._discard(file_path)
+            if size > self.budget_bytes or generation != self._generations.get(file_path, 0):
+                return
+            self._entries[file_path] = (signature, size, data)
+            self._size += size
+            while self._size > self.budget_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def invalidate(self, file_path):
+        """Drop a file after this process wrote it; stat alone can miss same-size rewrites"""
+        with self._lock:
+            self._generations[file_path] = self._generations.get(file_path, 0) + 1
+            self._discard(file_path)
+
+    def evict_dir(self, directory):
+        """Drop every cached file that lives in the given directory"""
+        with self._lock:
+            for file_path in [p for p in self._entries if os.path.dirname(p) == directory]:
+                self._discard(file_path)
+
+    def _discard(self, file_path):
+        entry = self._entries.pop(file_path, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+
+json_cache = JsonCache(CACHE_BUDGET_BYTES)
+
+
+def load_json_cached(file_path, default=None):
+    """Load a JSON file, reusing the parsed copy until it is written again.
+
+    Every write in this process calls json_cache.invalidate(); mtime and size
+    are also checked to catch edits made outside the server. The returned data
+    is shared between requests and must not be modified.
+    """
+    generation = json_cache.generation(file_path)
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return default
+    signature = (stat.st_mtime_ns, stat.st_size)
+    data = json_cache.get(file_path, signature)
+    if data is not None:
+        return data
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Parsed data is never smaller than the file, so skip estimating what can't fit
+    if stat.st_size <= json_cache.budget_bytes:
+        json_cache.put(file_path, signature, estimate_memory_size(data), data, generation)
+    return data
+
+
+def parse_history_date(value):
+    """Parse a history entry date, returning None if it can't be understood"""
+    if not isinstance(value, str):
+        return None
+    for fmt in (HISTORY_DATE_FORMAT, '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def history_bucket(entry_date, now):
+    """Return the (period, key) bucket an old history entry is folded into"""
+    if (now - entry_date).days < HISTORY_DAILY_DAYS:
+        return 'day', entry_date.strftime('%Y-%m-%d')
+    year, week, _ = entry_date.isocalendar()
+    return 'week', f'{year}-W{week:02d}'
+
+
+def compact_price_history(history, now=None):
+    """Apply the retention policy to a single product's history.
+
+    Returns (compacted_history, archived_entries) where archived_entries are
+    the raw entries that were moved out of the recent window.
+    """
+    now = now or datetime.now()
+    recent_cutoff = now - timedelta(days=HISTORY_RECENT_DAYS)
+
+    # Newest entry date folded into each bucket already in the history. A raw
+    # entry inside a bucket's range and not newer than that was counted on an
+    # earlier pass (e.g. a client posting old history back), so it is skipped.
+    folded = {}
+    for entry in history or []:
+        if isinstance(entry, dict) and 'period' in entry:
+            bucket_date = parse_history_date(entry.get('date'))
+            if bucket_date is not None:
+                bucket_key = (entry['period'], entry.get('bucket'))
+                folded[bucket_key] = max(folded.get(bucket_key, bucket_date), bucket_date)
+
+    def already_folded(entry_date):
+        year, week, _ = entry_date.isocalendar()
+        for bucket_key in (('day', entry_date.strftime('%Y-%m-%d')), ('week', f'{year}-W{week:02d}')):
+            if bucket_key in folded and entry_date <= folded[bucket_key]:
+                return True
+        return False
+
+    recent = []
+    to_fold = []
+    archived = []
+    for entry in history or []:
+        if not isinstance(entry, dict):
+            continue
+        entry_date = parse_history_date(entry.get('date'))
+        if 'period' in entry:
+            if entry_date is None:
+                # A bucket we can't place in time; keep it in the archive
+                archived.append(entry)
+            else:
+                to_fold.append((entry_date, entry))
+        elif entry_date is None or entry_date >= recent_cutoff:
+            recent.append((entry_date, entry))
+        elif not already_folded(entry_date):
+            to_fold.append((entry_date, entry))
+            archived.append(entry)
+
+    # Cap the full-resolution window, pushing the oldest overflow into buckets
+    recent.sort(key=lambda item: item[0] or now)
+    if len(recent) > HISTORY_MAX_RECENT:
+        overflow = recent[:-HISTORY_MAX_RECENT]
+        recent = recent[-HISTORY_MAX_RECENT:]
+        for entry_date, entry in overflow:
+            if entry_date is None:
+                archived.append(entry)
+            elif not already_folded(entry_date):
+                to_fold.append((entry_date, entry))
+                archived.append(entry)
+
+    buckets = {}
+    for entry_date, entry in to_fold:
+        period, key = history_bucket(entry_date, now)
+        price = entry.get('price', 0)
+        low = entry.get('min', price)
+        high = entry.get('max', price)
+        count = entry.get('count', 1)
+        bucket = buckets.get((period, key))
+        if bucket is None:
+            buckets[(period, key)] = {
+                'price': price,
+                'date': entry.get('date'),
+                'min': low,
+                'max': high,
+                'count': count,
+                'period': period,
+                'bucket': key,
+                '_sort': entry_date
+            }
+            continue
+        bucket['min'] = min(bucket['min'], low)
+        bucket['max'] = max(bucket['max'], high)
+        bucket['count'] += count
+        if entry_date >= bucket['_sort']:
+            bucket['price'] = price
+            bucket['date'] = entry.get('date')
+            bucket['_sort'] = entry_date
+
+    compacted = sorted(buckets.values(), key=lambda b: b['_sort'])
+    compacted = compacted[-HISTORY_MAX_COMPACTED:]
+    for bucket in compacted:
+        del bucket['_sort']
 
+    return compacted + [entry for _, entry in recent], archived
+
+
+def archive_file_path(product_id, archive_dir=None):
+    """Return the JSON Lines archive file of one product"""
+    archive_dir = archive_dir or get_file_path(PRICES_ARCHIVE_DIR)
+    return os.path.join(archive_dir, quote(product_id, safe='') + '.jsonl')
+
+
+def apply_history_retention(prices, archive_dir=None):
+    """Compact every product's history in place and archive old raw entries"""
+    archive_dir = archive_dir or get_file_path(PRICES_ARCHIVE_DIR)
+    now = datetime.now()
+    for product_id, data in prices.items():
+        if not isinstance(data, dict) or not data.get('history'):
+            continue
+        data['history'], archived = compact_price_history(data['history'], now)
+        if not archived:
+            continue
+        # Append-only; only this product's file is read, to skip entries
+        # that were archived before (e.g. history re-posted by a client)
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = archive_file_path(product_id, archive_dir)
+        seen = set()
+        if os.path.exists(archive_path):
+            with open(archive_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        seen.add((entry.get('date'), entry.get('price')))
+        with open(archive_path, 'a', encoding='utf-8') as f:
+            for entry in archived:
+                entry_key = (entry.get('date'), entry.get('price'))
+                if entry_key not in seen:
+                    seen.add(entry_key)
+                    f.write(json.dumps(entry) + '\n')
+    return prices
+
+
+class PriceWriteQueue:
+    """Coalesce single-price updates into batched writes of each prices file"""
+
+    def __init__(self, window_seconds, batch_size):
+        self.window_seconds = window_seconds
+        self.batch_size = batch_size
+        self._pending = {}  # prices file path -> {product_id: price data}
+        self._pending_lock = threading.Lock()
+        # One lock per prices file, held while it is read/modified/written so
+        # batched writes and the other price endpoints never interleave
+        self._file_locks = {}
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def submit(self, product_id, data, prices_path=None):
+        """Queue an update; later updates to the same product replace earlier ones"""
+        prices_path = prices_path or get_file_path(PRICES_FILE)
+        with self._pending_lock:
+            self._pending.setdefault(prices_path, {})[product_id] = data
+            pending_count = sum(len(updates) for updates in self._pending.values())
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='price-write-queue', daemon=True)
+                self._worker.start()
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self, prices_path=None):
+        """Write pending updates now (for one file, or all); returns the number of products written"""
+        if prices_path is None:
+            with self._pending_lock:
+                paths = list(self._pending)
+        else:
+            paths = [prices_path]
+        written = 0
+        error = None
+        for path in paths:
+            try:
+                with self._lock_for(path):
+                    written += self._write_pending(path)
+            except Exception as e:
+                # Keep going so one broken file doesn't hold up the others
+                print(f"Error flushing price updates to {path}: {str(e)}")  # Server-side logging
+                error = error or e
+        if error is not None:
+            raise error
+        return written
+
+    @contextmanager
+    def exclusive(self, prices_path=None):
+        """Flush pending updates and hold the file lock for a read-modify-write"""
+        prices_path = prices_path or get_file_path(PRICES_FILE)
+        with self._lock_for(prices_path):
+            self._write_pending(prices_path)
+            yield
+
+    def _lock_for(self, prices_path):
+        with self._pending_lock:
+            return self._file_locks.setdefault(prices_path, threading.RLock())
+
+    def _take_pending(self, prices_path):
+        with self._pending_lock:
+            return self._pending.pop(prices_path, None)
+
+    def _requeue(self, prices_path, updates):
+        with self._pending_lock:
+            pending = self._pending.setdefault(prices_path, {})
+            for product_id, data in updates.items():
+                # Don't clobber anything submitted while the write was failing
+                pending.setdefault(product_id, data)
+
+    def _write_pending(self, prices_path):
+        updates = self._take_pending(prices_path)
+        if not updates:
+            return 0
+        try:
+            prices = {}
+            if os.path.exists(prices_path):
+                with open(prices_path, 'r') as f:
+                    prices = json.load(f)
+            prices.update(updates)
+            # Runs outside of any request, so keep the archive next to this file
+            archive_dir = os.path.join(os.path.dirname(prices_path), os.path.basename(PRICES_ARCHIVE_DIR))
+            apply_history_retention({product_id: prices[product_id] for product_id in updates}, archive_dir)
+            with open(prices_path, 'w') as f:
+                json.dump(prices, f, indent=2)
+            json_cache.invalidate(prices_path)
+        except Exception:
+            self._requeue(prices_path, updates)
+            raise
+        return len(updates)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.window_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # Already logged per file by flush()
+
+
+price_write_queue = PriceWriteQueue(PRICE_WRITE_WINDOW_SECONDS, PRICE_WRITE_BATCH_SIZE)
+atexit.register(price_write_queue.flush)
+
+
+class TenantPrefixMiddleware:
+    """Map /t/<tenant_id>/<path> onto /<path> with the tenant ID in the X-Tenant-ID header"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        parts = environ.get('PATH_INFO', '').split('/', 3)
+        if len(parts) >= 3 and parts[1] == 't' and parts[2]:
+            environ['HTTP_X_TENANT_ID'] = parts[2]
+            # Keep the prefix in SCRIPT_NAME so url_for() builds tenant URLs
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f'/t/{parts[2]}'
+            environ['PATH_INFO'] = '/' + (parts[3] if len(parts) > 3 else '')
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = TenantPrefixMiddleware(app.wsgi_app)
+
+# Tenant ID -> time of its last request, used to evict idle tenants
+_tenant_last_seen = {}
+_tenant_lock = threading.Lock()
+_last_tenant_sweep = time.monotonic()
+
+
+def evict_idle_tenants(now=None):
+    """Flush and drop the cached data of tenants idle for TENANT_IDLE_SECONDS"""
+    now = now or time.monotonic()
+    with _tenant_lock:
+        idle = {tenant_id: last_seen for tenant_id, last_seen in _tenant_last_seen.items()
+                if now - last_seen > TENANT_IDLE_SECONDS}
+        for tenant_id in idle:
+            del _tenant_last_seen[tenant_id]
+    evicted = []
+    for tenant_id, last_seen in idle.items():
+        data_dir = tenant_data_dir(tenant_id)
+        try:
+            price_write_queue.flush(os.path.join(data_dir, os.path.basename(PRICES_FILE)))
+        except Exception as e:
+            print(f"Error evicting idle tenant {tenant_id}: {str(e)}")  # Server-side logging
+            # Track it again so the next sweep retries, unless it became active meanwhile
+            with _tenant_lock:
+                _tenant_last_seen.setdefault(tenant_id, last_seen)
+            continue
+        json_cache.evict_dir(data_dir)
+        evicted.append(tenant_id)
+    return evicted
+
+
+@app.before_request
+def select_tenant():
+    """Scope the request to the tenant named in the X-Tenant-ID header, if any.
+
+    Tenants are provisioned by creating TENANTS_DIR/<tenant_id>; requests for
+    any other tenant ID get a 404, whatever the method.
+    """
+    global _last_tenant_sweep
+    g.tenant_id = None
+    tenant_id = request.headers.get(TENANT_HEADER, '').strip()
+    if tenant_id:
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            return jsonify({'message': 'Invalid tenant ID'}), 400
+        data_dir = tenant_data_dir(tenant_id)
+        if not os.path.isdir(data_dir):
+            return jsonify({'message': 'Unknown tenant'}), 404
+        g.tenant_id = tenant_id
+
+    now = time.monotonic()
+    with _tenant_lock:
+        if tenant_id:
+            _tenant_last_seen[tenant_id] = now
+        sweep = now - _last_tenant_sweep > TENANT_SWEEP_SECONDS
+        if sweep:
+            _last_tenant_sweep = now
+    if sweep:
+        # Never fails the current request; errors are logged per tenant
+        evict_idle_tenants(now)
 
 
 @app.route('/download_all', methods=['GET'])
@@ -71,29 +557,37 @@ def download_all_files():
         with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
             # List of files to include in the download
             files_to_download = {
-                'products.csv': PRODUCTS_FILE,
-                'product_prices.json': PRICES_FILE,
-                'quotation_status.json': STATUS_FILE,
-                'quotation_history.json': HISTORY_FILE,
-                'analytics.json': ANALYTICS_FILE,
-                'categories.json': CATEGORIES_FILE,
-                'deleted_quotes.json': DELETIONS_FILE
+                'products.csv': get_file_path(PRODUCTS_FILE),
+                'product_prices.json': get_file_path(PRICES_FILE),
+                'quotation_status.json': get_file_path(STATUS_FILE),
+                'quotation_history.json': get_file_path(HISTORY_FILE),
+                'analytics.json': get_file_path(ANALYTICS_FILE),
+                'categories.json': get_file_path(CATEGORIES_FILE),
+                'deleted_quotes.json': get_file_path(DELETIONS_FILE)
             }
             
-            # Add each file to the zip if it exists
-            for filename, filepath in files_to_download.items():
-                if os.path.exists(filepath):
-                    # Read file content
-                    with open(filepath, 'rb') as f:
-                        file_content = f.read()
-                    # Write to zip with proper filename
-                    zf.writestr(filename, file_content)
-                else:
-                    # Create empty file if it doesn't exist
-                    if filename.endswith('.json'):
-                        zf.writestr(filename, '{}')
-                    elif filename.endswith('.csv'):
-                        zf.writestr(filename, 'ID,Name,Description,Photo,Category\n')
+            # Hold the prices lock so queued updates are included and not half-written
+            with price_write_queue.exclusive():
+                # Add each file to the zip if it exists
+                for filename, filepath in files_to_download.items():
+                    if os.path.exists(filepath):
+                        # Read file content
+                        with open(filepath, 'rb') as f:
+                            file_content = f.read()
+                        # Write to zip with proper filename
+                        zf.writestr(filename, file_content)
+                    else:
+                        # Create empty file if it doesn't exist
+                        if filename.endswith('.json'):
+                            zf.writestr(filename, '{}')
+                        elif filename.endswith('.csv'):
+                            zf.writestr(filename, 'ID,Name,Description,Photo,Category\n')
+
+                # Add the per-product price history archive files
+                archive_dir = get_file_path(PRICES_ARCHIVE_DIR)
+                if os.path.isdir(archive_dir):
+                    for archive_name in sorted(os.listdir(archive_dir)):
+                        zf.write(os.path.join(archive_dir, archive_name), f'product_prices_archive/{archive_name}')
         
         # Reset file pointer to beginning
         memory_file.seek(0)
@@ -130,13 +624,14 @@ def handle_categories():
                 return jsonify({'message': 'No categories data provided'}), 400
                 
             # Save categories data
-            with open(CATEGORIES_FILE, 'w', encoding='utf-8') as f:
+            with open(get_file_path(CATEGORIES_FILE), 'w', encoding='utf-8') as f:
                 json.dump(categories_data, f, indent=2)
+            json_cache.invalidate(get_file_path(CATEGORIES_FILE))
             
             return jsonify({'message': 'Categories updated successfully'}), 200
             
         else:  # GET request
-            if not os.path.exists(CATEGORIES_FILE):
+            if not os.path.exists(get_file_path(CATEGORIES_FILE)):
                 # Initialize with default categories if file doesn't exist
                 default_categories = [
                     {"id": "equipment", "name": "Equipment"},
@@ -144,13 +639,13 @@ def handle_categories():
                     {"id": "consumables", "name": "Consumables"},
                     {"id": "other", "name": "Uncategorized"}
                 ]
-                with open(CATEGORIES_FILE, 'w', encoding='utf-8') as f:
+                with open(get_file_path(CATEGORIES_FILE), 'w', encoding='utf-8') as f:
                     json.dump(default_categories, f, indent=2)
+                json_cache.invalidate(get_file_path(CATEGORIES_FILE))
                 return jsonify(default_categories), 200
                 
             # Return categories data
-            with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
-                categories = json.load(f)
+            categories = load_json_cached(get_file_path(CATEGORIES_FILE), [])
             return jsonify(categories), 200
             
     except Exception as e:
@@ -163,7 +658,7 @@ def handle_single_category(category_id):
     """Handle operations on a single category"""
     try:
         # Load current categories
-        if not os.path.exists(CATEGORIES_FILE):
+        if not os.path.exists(get_file_path(CATEGORIES_FILE)):
             # Initialize with default categories if file doesn't exist
             default_categories = [
                 {"id": "equipment", "name": "Equipment"},
@@ -173,7 +668,7 @@ def handle_single_category(category_id):
             ]
             categories = default_categories
         else:
-            with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
+            with open(get_file_path(CATEGORIES_FILE), 'r', encoding='utf-8') as f:
                 categories = json.load(f)
         
         if request.method == 'GET':
@@ -206,8 +701,9 @@ def handle_single_category(category_id):
                 })
                 
             # Save updated categories
-            with open(CATEGORIES_FILE, 'w', encoding='utf-8') as f:
+            with open(get_file_path(CATEGORIES_FILE), 'w', encoding='utf-8') as f:
                 json.dump(categories, f, indent=2)
+            json_cache.invalidate(get_file_path(CATEGORIES_FILE))
                 
             return jsonify({'message': 'Category updated successfully'}), 200
         
@@ -220,8 +716,9 @@ def handle_single_category(category_id):
                 return jsonify({'message': 'Category not found'}), 404
                 
             # Save updated categories
-            with open(CATEGORIES_FILE, 'w', encoding='utf-8') as f:
+            with open(get_file_path(CATEGORIES_FILE), 'w', encoding='utf-8') as f:
                 json.dump(categories, f, indent=2)
+            json_cache.invalidate(get_file_path(CATEGORIES_FILE))
                 
             return jsonify({'message': 'Category deleted successfully'}), 200
             
@@ -240,7 +737,7 @@ def handle_products():
             if 'file' in request.files:
                 file = request.files['file']
                 print('File: File; FIle FILE FILE FLE : ', request.files)
-                file.save('server_data/products.csv')
+                file.save(file_path)
                 return 'OK', 200
 
                 
@@ -287,13 +784,13 @@ def update_single_product(product_id):
         # Load existing products
         products = []
         header = ['ID', 'Name', 'Description', 'Photo', 'Category']  # Updated to include Category
-        if os.path.exists(PRODUCTS_FILE):
-            df = pd.read_csv(PRODUCTS_FILE, quoting=csv.QUOTE_ALL, escapechar='\\', encoding='utf-8')
+        if os.path.exists(get_file_path(PRODUCTS_FILE)):
+            df = pd.read_csv(get_file_path(PRODUCTS_FILE), quoting=csv.QUOTE_ALL, escapechar='\\', encoding='utf-8')
             products = df.values.tolist()
         else:
             # Create new file with header if it doesn't exist
             df = pd.DataFrame(columns=header)
-            df.to_csv(PRODUCTS_FILE, index=False, quoting=csv.QUOTE_ALL, escapechar='\\', encoding='utf-8')
+            df.to_csv(get_file_path(PRODUCTS_FILE), index=False, quoting=csv.QUOTE_ALL, escapechar='\\', encoding='utf-8')
 
         # Check if product exists
         product_exists = False
@@ -323,7 +820,7 @@ def update_single_product(product_id):
 
         # Save updated products back to CSV
         df = pd.DataFrame(products, columns=header)  # Use updated header
-        df.to_csv(PRODUCTS_FILE, index=False, quoting=csv.QUOTE_ALL, escapechar='\\', encoding='utf-8')
+        df.to_csv(get_file_path(PRODUCTS_FILE), index=False, quoting=csv.QUOTE_ALL, escapechar='\\', encoding='utf-8')
 
         return jsonify({
             'message': 'Product updated successfully' if product_exists else 'Product created successfully',
@@ -350,54 +847,63 @@ def handle_prices():
             price_data = request.get_json()
             if not price_data:
                 return jsonify({'message': 'No price data provided'}), 400
-            # Load existing prices
-            existing_prices = {}
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    existing_prices = json.load(f)
-            
-            # Update prices with new data
-            for product_id, data in price_data.items():
-                if product_id not in existing_prices:
-                    existing_prices[product_id] = {
-                        'name': data.get('name', ''),
-                        'price': data.get('price', 0),
-                        'history': data.get('history', []),  # Preserve incoming history
-                        'last_modified': data.get('last_modified', datetime.now().strftime('%Y-%m-%d %H:%M'))
-                    }
-                else:
-                    current_price = existing_prices[product_id].get('price', 0)
-                    if current_price != data.get('price', 0):
-                        # Add to history only if price changed
-                        history_entry = {
+            with price_write_queue.exclusive():
+                # Load existing prices
+                existing_prices = {}
+                if os.path.exists(file_path):
+                    with open(file_path, 'r') as f:
+                        existing_prices = json.load(f)
+            
+                # Update prices with new data
+                for product_id, data in price_data.items():
+                    if product_id not in existing_prices:
+                        existing_prices[product_id] = {
+                            'name': data.get('name', ''),
                             'price': data.get('price', 0),
-                            'date': datetime.now().strftime('%Y-%m-%d %H:%M')
+                            'history': data.get('history', []),  # Preserve incoming history
+                            'last_modified': data.get('last_modified', datetime.now().strftime('%Y-%m-%d %H:%M'))
                         }
-                        # Merge existing history with incoming history
-                        existing_history = existing_prices[product_id].get('history', [])
-                        incoming_history = data.get('history', [])
-                        merged_history = list({(entry.get('date'), entry.get('price')): entry 
-                                            for entry in existing_history + incoming_history}.values())
-                        merged_history.append(history_entry)
-                        
-                        existing_prices[product_id].update({
-                            'price': data.get('price', 0),
-                            'name': data.get('name', ''),
-                            'history': merged_history,
-                            'last_modified': datetime.now().strftime('%Y-%m-%d %H:%M')
-                        })
                     else:
-                        # Only update name and preserve existing history if price hasn't changed
-                        existing_prices[product_id]['name'] = data.get('name', '')
-                        existing_prices[product_id]['history'] = (
-                            data.get('history', existing_prices[product_id].get('history', []))
-                        )
-                        if 'last_modified' in data:
-                            existing_prices[product_id]['last_modified'] = data['last_modified']
-            
-            # Save updated prices
-            with open(file_path, 'w') as f:
-                json.dump(existing_prices, f, indent=2)
+                        current_price = existing_prices[product_id].get('price', 0)
+                        if current_price != data.get('price', 0):
+                            # Add to history only if price changed
+                            history_entry = {
+                                'price': data.get('price', 0),
+                                'date': datetime.now().strftime('%Y-%m-%d %H:%M')
+                            }
+                            # Merge existing history with incoming history
+                            existing_history = existing_prices[product_id].get('history', [])
+                            incoming_history = data.get('history', [])
+                            merged_history = list({(entry.get('date'), entry.get('price'), entry.get('period')): entry 
+                                                for entry in existing_history + incoming_history}.values())
+                            merged_history.append(history_entry)
+                        
+                            existing_prices[product_id].update({
+                                'price': data.get('price', 0),
+                                'name': data.get('name', ''),
+                                'history': merged_history,
+                                'last_modified': datetime.now().strftime('%Y-%m-%d %H:%M')
+                            })
+                        else:
+                            # Only update name and merge history if price hasn't changed,
+                            # keeping existing downsampled buckets the client may not have
+                            existing_prices[product_id]['name'] = data.get('name', '')
+                            existing_history = existing_prices[product_id].get('history', [])
+                            incoming_history = data.get('history', [])
+                            existing_prices[product_id]['history'] = list(
+                                {(entry.get('date'), entry.get('price'), entry.get('period')): entry
+                                 for entry in existing_history + incoming_history}.values()
+                            )
+                            if 'last_modified' in data:
+                                existing_prices[product_id]['last_modified'] = data['last_modified']
+            
+                # Downsample old history so the file stays bounded
+                apply_history_retention(existing_prices)
+            
+                # Save updated prices
+                with open(file_path, 'w') as f:
+                    json.dump(existing_prices, f, indent=2)
+                json_cache.invalidate(file_path)
             
             return jsonify({'message': 'Prices updated successfully'}), 200
             
@@ -406,14 +912,15 @@ def handle_prices():
     
     else:  # GET request
         try:
-            if not os.path.exists(file_path):
-                # Initialize empty prices file if it doesn't exist
-                with open(file_path, 'w') as f:
-                    json.dump({}, f)
-                return jsonify({}), 200
+            with price_write_queue.exclusive():
+                if not os.path.exists(file_path):
+                    # Initialize empty prices file if it doesn't exist
+                    with open(file_path, 'w') as f:
+                        json.dump({}, f)
+                    json_cache.invalidate(file_path)
+                    return jsonify({}), 200
                 
-            with open(file_path, 'r') as f:
-                prices = json.load(f)
+                prices = load_json_cached(file_path, {})
             
             # Return the entire prices dictionary including history
             return jsonify(prices), 200
@@ -450,43 +957,69 @@ def delete_product(product_id):
 
 @app.route('/prices/<product_id>', methods=['POST'])
 def update_single_price(product_id):
+    """Queue a single price update; pass ?sync=true to wait until it is on disk"""
     try:
-        # Load current prices
-        prices_path = get_file_path(PRICES_FILE)
-        with open(prices_path, 'r') as f:
-            prices = json.load(f)
-        
-        # Update single product price
-        prices[product_id] = request.json
-        
-        # Save updated prices
-        with open(prices_path, 'w') as f:
-            json.dump(prices, f, indent=2)
-            
-        return jsonify({'message': 'Price updated successfully'}), 200
+        price_data = request.get_json()
+        if not price_data:
+            return jsonify({'message': 'No price data provided'}), 400
+
+        # Updates are coalesced and written in batches by price_write_queue
+        price_write_queue.submit(product_id, price_data)
+
+        if request.args.get('sync', '').lower() in ('1', 'true', 'yes'):
+            price_write_queue.flush(get_file_path(PRICES_FILE))
+            return jsonify({'message': 'Price updated successfully', 'queued': False}), 200
+
+        return jsonify({'message': 'Price update queued', 'queued': True}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/price_queue/flush', methods=['POST'])
+def flush_prices():
+    """Write the current tenant's queued price updates to disk before responding"""
+    try:
+        written = price_write_queue.flush(get_file_path(PRICES_FILE))
+        return jsonify({'message': 'Price updates flushed', 'written': written}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/prices/<product_id>/archive', methods=['GET'])
+def get_price_archive(product_id):
+    """Return the full-resolution history that was compacted out of product_prices.json"""
+    try:
+        with price_write_queue.exclusive():
+            archive_path = archive_file_path(product_id)
+            if not os.path.exists(archive_path):
+                return jsonify([]), 200
+            with open(archive_path, 'r', encoding='utf-8') as f:
+                archive = [json.loads(line) for line in f if line.strip()]
+        return jsonify(archive), 200
+    except Exception as e:
+        print(f"Error in GET /prices/{product_id}/archive: {str(e)}")  # Debug print
+        return jsonify({'message': f'Server error: {str(e)}'}), 500
+
 @app.route('/prices/<product_id>', methods=['DELETE'])
 def delete_price(product_id):
     prices_path = get_file_path(PRICES_FILE)
     try:
-        # Read existing prices
-        with open(prices_path, 'r') as f:
-            prices = json.load(f)
+        with price_write_queue.exclusive():
+            # Read existing prices
+            with open(prices_path, 'r') as f:
+                prices = json.load(f)
             
-        # Remove price if exists
-        if product_id in prices:
-            del prices[product_id]
+            # Remove price if exists
+            if product_id in prices:
+                del prices[product_id]
             
-            # Write back updated prices
-            with open(prices_path, 'w') as f:
-                json.dump(prices, f, indent=2)
+                # Write back updated prices
+                with open(prices_path, 'w') as f:
+                    json.dump(prices, f, indent=2)
+                json_cache.invalidate(prices_path)
                 
-            return jsonify({'message': 'Price deleted successfully'}), 200
-        else:
-            return jsonify({'message': 'Price not found'}), 404
+                return jsonify({'message': 'Price deleted successfully'}), 200
+            else:
+                return jsonify({'message': 'Price not found'}), 404
     except Exception as e:
         return jsonify({'message': f'Error deleting price: {str(e)}'}), 500
     
@@ -558,28 +1091,30 @@ def handle_quotes():
                 
             # Load existing quotes
             existing_quotes = {}
-            if os.path.exists(STATUS_FILE):
-                with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+            if os.path.exists(get_file_path(STATUS_FILE)):
+                with open(get_file_path(STATUS_FILE), 'r', encoding='utf-8') as f:
                     existing_quotes = json.load(f)
             
             # Merge new quotes with existing ones
             existing_quotes.update(new_quotes)
                 
             # Save merged quotes
-            with open(STATUS_FILE, 'w', encoding='utf-8') as f:
+            with open(get_file_path(STATUS_FILE), 'w', encoding='utf-8') as f:
                 json.dump(existing_quotes, f, indent=2)
+            json_cache.invalidate(get_file_path(STATUS_FILE))
             
             return jsonify({'message': 'Quotes updated successfully'}), 200
             
         else:  # GET request
-            if not os.path.exists(STATUS_FILE):
+            if not os.path.exists(get_file_path(STATUS_FILE)):
                 # Initialize empty quotes file if it doesn't exist
-                with open(STATUS_FILE, 'w', encoding='utf-8') as f:
+                with open(get_file_path(STATUS_FILE), 'w', encoding='utf-8') as f:
                     json.dump({}, f)
+                json_cache.invalidate(get_file_path(STATUS_FILE))
                 return jsonify({}), 200
                 
             # Return quotes data from quotation_status.json
-            with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+            with open(get_file_path(STATUS_FILE), 'r', encoding='utf-8') as f:
                 quotes = json.load(f)
             return jsonify(quotes), 200
             
@@ -596,16 +1131,16 @@ def delete_quote(quote_id):
         history_data = []
         analytics_data = []
         
-        if os.path.exists(STATUS_FILE):
-            with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+        if os.path.exists(get_file_path(STATUS_FILE)):
+            with open(get_file_path(STATUS_FILE), 'r', encoding='utf-8') as f:
                 status_data = json.load(f)
                 
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+        if os.path.exists(get_file_path(HISTORY_FILE)):
+            with open(get_file_path(HISTORY_FILE), 'r', encoding='utf-8') as f:
                 history_data = json.load(f)
                 
-        if os.path.exists(ANALYTICS_FILE):
-            with open(ANALYTICS_FILE, 'r', encoding='utf-8') as f:
+        if os.path.exists(get_file_path(ANALYTICS_FILE)):
+            with open(get_file_path(ANALYTICS_FILE), 'r', encoding='utf-8') as f:
                 analytics_data = json.load(f)
         
         # Check if quote exists
@@ -625,14 +1160,17 @@ def delete_quote(quote_id):
         analytics_data = [a for a in analytics_data if a['date'] != quote_date]
         
         # Save all updated data
-        with open(STATUS_FILE, 'w', encoding='utf-8') as f:
+        with open(get_file_path(STATUS_FILE), 'w', encoding='utf-8') as f:
             json.dump(status_data, f, indent=2)
+        json_cache.invalidate(get_file_path(STATUS_FILE))
             
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
+        with open(get_file_path(HISTORY_FILE), 'w', encoding='utf-8') as f:
             json.dump(history_data, f, indent=2)
+        json_cache.invalidate(get_file_path(HISTORY_FILE))
             
-        with open(ANALYTICS_FILE, 'w', encoding='utf-8') as f:
+        with open(get_file_path(ANALYTICS_FILE), 'w', encoding='utf-8') as f:
             json.dump(analytics_data, f, indent=2)
+        json_cache.invalidate(get_file_path(ANALYTICS_FILE))
             
         return jsonify({
             'message': 'Quote deleted successfully from all records',
@@ -648,38 +1186,148 @@ def delete_quote(quote_id):
     
 
 
-# Update debug view to show categories
+def iter_product_rows(products_path):
+    """Yield product rows from the CSV one at a time, skipping the header"""
+    if not os.path.exists(products_path):
+        return
+    with open(products_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, quoting=csv.QUOTE_ALL, escapechar='\\')
+        next(reader, None)  # Skip header
+        yield from reader
+
+
+def iter_json_records(file_path):
+    """Yield (key, value) pairs from a JSON object, or (index, item) from a list"""
+    data = load_json_cached(file_path)
+    if isinstance(data, dict):
+        yield from data.items()
+    elif isinstance(data, list):
+        yield from enumerate(data)
+
+
+def format_price(value):
+    try:
+        return f"${float(value):.2f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def format_price_history(history):
+    """Render the newest history entries as short strings for the debug view"""
+    history = history or []
+    lines = []
+    for entry in history[-DEBUG_HISTORY_ENTRIES:]:
+        if not isinstance(entry, dict):
+            continue
+        line = f"{format_price(entry.get('price'))} ({entry.get('date')})"
+        if entry.get('period'):
+            line += (f" - {entry['period']} {entry.get('bucket')}: "
+                     f"min {format_price(entry.get('min'))}, max {format_price(entry.get('max'))}")
+        lines.append(line)
+    if len(history) > DEBUG_HISTORY_ENTRIES:
+        lines.insert(0, f"... {len(history) - DEBUG_HISTORY_ENTRIES} older entries")
+    return lines
+
+
+def debug_page_size(section=None):
+    """Read the page size for a debug section (or the default for all of them), clamped"""
+    limit = request.args.get(f'{section}_limit', type=int) if section else None
+    limit = limit or request.args.get('limit', type=int)
+    return max(1, min(limit or DEBUG_PAGE_SIZE, DEBUG_MAX_PAGE_SIZE))
+
+
+def debug_page_args(section):
+    """Read the page number and page size for a debug section from the query string"""
+    page = max(1, request.args.get(f'{section}_page', 1, type=int) or 1)
+    return page, debug_page_size(section)
+
+
+def debug_page_url(section, page):
+    args = request.args.to_dict()
+    args[f'{section}_page'] = page
+    return url_for('debug_view', **args) + f'#{section}'
+
+
+def paginate_debug_section(section, title, columns, rows, search):
+    """Filter rows by the search term and cut out the requested page.
+
+    Only the rows on the page (plus one to detect a next page) are
+    materialised, so large files are never rendered in full.
+    """
+    page, limit = debug_page_args(section)
+    if search:
+        needle = search.lower()
+        rows = (row for row in rows if needle in ' '.join(map(str, row)).lower())
+    start = (page - 1) * limit
+    page_rows = list(itertools.islice(rows, start, start + limit + 1))
+    has_next = len(page_rows) > limit
+    return {
+        'id': section,
+        'title': title,
+        'columns': columns,
+        'rows': page_rows[:limit],
+        'page': page,
+        'prev_url': debug_page_url(section, page - 1) if page > 1 else None,
+        'next_url': debug_page_url(section, page + 1) if has_next else None
+    }
+
+
+def iter_debug_sections(search):
+    """Build each debug section lazily so the template can stream them one by one"""
+    yield paginate_debug_section(
+        'products', 'Products', ['ID', 'Name', 'Description', 'Photo', 'Category'],
+        iter_product_rows(get_file_path(PRODUCTS_FILE)), search
+    )
+
+    yield paginate_debug_section(
+        'categories', 'Categories', ['ID', 'Name'],
+        ([cat.get('id'), cat.get('name')] for _, cat in iter_json_records(get_file_path(CATEGORIES_FILE))
+         if isinstance(cat, dict)),
+        search
+    )
+
+    yield paginate_debug_section(
+        'prices', 'Prices', ['Product ID', 'Name', 'Current Price', 'Last Modified', 'Price History'],
+        ([product_id, data.get('name'), format_price(data.get('price')), data.get('last_modified'),
+          format_price_history(data.get('history'))]
+         for product_id, data in iter_json_records(get_file_path(PRICES_FILE)) if isinstance(data, dict)),
+        search
+    )
+
+    for section, title, file_path in [
+        ('status', 'Quotation Status', get_file_path(STATUS_FILE)),
+        ('history', 'Quotation History', get_file_path(HISTORY_FILE)),
+        ('analytics', 'Analytics', get_file_path(ANALYTICS_FILE))
+    ]:
+        yield paginate_debug_section(
+            section, title, ['Key', 'Data'],
+            ([key, json.dumps(value, ensure_ascii=False)] for key, value in iter_json_records(file_path)),
+            search
+        )
+
+
 @app.route('/debug', methods=['GET'])
 def debug_view():
-    data = {
-        'products': [],
-        'prices': {},
-        'history': {},
-        'status': {},
-        'analytics': {},
-        'categories': []  # Add categories to debug view
-    }
-    
-    # Load products
-    products_path = get_file_path(PRODUCTS_FILE)
-    if os.path.exists(products_path):
-        with open(products_path, 'r', encoding='utf-8', newline='') as f:
-            reader = csv.reader(f, quoting=csv.QUOTE_ALL, escapechar='\\')
-            data['products'] = list(reader)[1:]  # Skip header
-    
-    # Load categories
-    if os.path.exists(CATEGORIES_FILE):
-        with open(CATEGORIES_FILE, 'r') as f:
-            data['categories'] = json.load(f)
-    
-    # Load other JSON files
-    for file_type in ['prices', 'history', 'status', 'analytics']:
-        file_path = get_file_path(f'server_{file_type}.json')
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data[file_type] = json.load(f)
-    
-    return render_template('index.html', **data)
+    """Paginated debug view over the server data, streamed section by section.
+
+    Query parameters: q (search term), limit (page size for every section),
+    <section>_page and <section>_limit (per-section page and page size).
+    """
+    # Flush queued price updates before streaming starts, so a write error
+    # becomes a proper error response instead of a truncated page
+    try:
+        price_write_queue.flush(get_file_path(PRICES_FILE))
+    except Exception as e:
+        print(f"Error flushing prices for /debug: {str(e)}")  # Debug print
+        return jsonify({'message': f'Server error: {str(e)}'}), 500
+
+    search = request.args.get('q', '').strip()
+    return stream_template(
+        'index.html',
+        sections=iter_debug_sections(search),
+        search=search,
+        limit=debug_page_size()
+    )
 
 
 # Update the backup function to include categories file
@@ -688,25 +1336,31 @@ def create_server_backup():
     """Create a backup of all server data files"""
     try:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_dir = os.path.join(DATA_DIR, 'server_backups', f'backup_{timestamp}')
+        backup_dir = os.path.join(tenant_data_dir(), 'server_backups', f'backup_{timestamp}')
         os.makedirs(backup_dir, exist_ok=True)
         
         # List of files to backup with their proper paths
         files_to_backup = {
-            'products.csv': PRODUCTS_FILE,
-            'product_prices.json': PRICES_FILE,
-            'quotation_status.json': STATUS_FILE,
-            'quotation_history.json': HISTORY_FILE,
-            'analytics.json': ANALYTICS_FILE,
-            'categories.json': CATEGORIES_FILE  # Add categories file to backup
+            'products.csv': get_file_path(PRODUCTS_FILE),
+            'product_prices.json': get_file_path(PRICES_FILE),
+            'quotation_status.json': get_file_path(STATUS_FILE),
+            'quotation_history.json': get_file_path(HISTORY_FILE),
+            'analytics.json': get_file_path(ANALYTICS_FILE),
+            'categories.json': get_file_path(CATEGORIES_FILE)  # Add categories file to backup
         }
         
-        backed_up_files = []
-        for filename, filepath in files_to_backup.items():
-            if os.path.exists(filepath):
-                backup_path = os.path.join(backup_dir, filename)
-                shutil.copy2(filepath, backup_path)
-                backed_up_files.append(filename)
+        with price_write_queue.exclusive():
+            backed_up_files = []
+            for filename, filepath in files_to_backup.items():
+                if os.path.exists(filepath):
+                    backup_path = os.path.join(backup_dir, filename)
+                    shutil.copy2(filepath, backup_path)
+                    backed_up_files.append(filename)
+
+            archive_dir = get_file_path(PRICES_ARCHIVE_DIR)
+            if os.path.isdir(archive_dir):
+                shutil.copytree(archive_dir, os.path.join(backup_dir, 'product_prices_archive'), dirs_exist_ok=True)
+                backed_up_files.append('product_prices_archive/')
         
         if not backed_up_files:
             raise Exception("No files were backed up - no data files found")
@@ -0,0 +1,138 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import price_server
+
+
+def history_date(value):
+    return value.strftime(price_server.HISTORY_DATE_FORMAT)
+
+
+def test_later_entry_on_same_day_is_folded_into_existing_bucket():
+    now = datetime.now()
+    day = (now - timedelta(days=60)).replace(hour=9, minute=0, second=0, microsecond=0)
+    morning = {'price': 1, 'date': history_date(day)}
+    evening = {'price': 2, 'date': history_date(day.replace(hour=17))}
+
+    history, archived = price_server.compact_price_history([morning], now)
+    assert archived == [morning]
+
+    history, archived = price_server.compact_price_history(history + [evening], now)
+    assert archived == [evening]
+    assert len(history) == 1
+    bucket = history[0]
+    assert bucket['period'] == 'day'
+    assert bucket['count'] == 2
+    assert (bucket['min'], bucket['max'], bucket['price']) == (1, 2, 2)
+
+
+def test_reposted_entry_is_not_counted_twice():
+    now = datetime.now()
+    entry = {'price': 1, 'date': history_date(now - timedelta(days=60))}
+
+    history, _ = price_server.compact_price_history([entry], now)
+    history, archived = price_server.compact_price_history(history + [dict(entry)], now)
+    history, archived = price_server.compact_price_history(history + [dict(entry)], now)
+
+    assert archived == []
+    assert [bucket['count'] for bucket in history] == [1]
+
+
+def test_overflow_entries_on_same_day_all_reach_the_bucket(monkeypatch):
+    monkeypatch.setattr(price_server, 'HISTORY_MAX_RECENT', 2)
+    now = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    entries = [{'price': i, 'date': history_date(now - timedelta(minutes=10 * (5 - i)))}
+               for i in range(1, 5)]
+
+    history, archived = price_server.compact_price_history(entries[:3], now)
+    assert archived == [entries[0]]
+
+    history, archived = price_server.compact_price_history(history + [entries[3]], now)
+    assert archived == [entries[1]]
+    buckets = [entry for entry in history if 'period' in entry]
+    assert len(buckets) == 1
+    assert buckets[0]['count'] == 2
+    assert (buckets[0]['min'], buckets[0]['max']) == (1, 2)
+    assert [entry for entry in history if 'period' not in entry] == entries[2:]
+
+
+def test_undated_entries_are_archived_not_dropped(monkeypatch):
+    monkeypatch.setattr(price_server, 'HISTORY_MAX_RECENT', 1)
+    undated = [{'price': 1, 'date': 'unknown'}, {'price': 2, 'date': 'unknown'}]
+    undated_bucket = {'price': 3, 'period': 'day', 'bucket': '2020-01-01'}
+
+    history, archived = price_server.compact_price_history(undated + [undated_bucket])
+
+    assert len(history) == 1
+    assert undated_bucket in archived
+    assert len(archived) == 2
+
+
+def test_archive_skips_entries_already_archived(tmp_path):
+    entry = {'price': 1, 'date': history_date(datetime.now() - timedelta(days=60))}
+
+    for _ in range(3):
+        price_server.apply_history_retention({'p1': {'history': [dict(entry)]}}, str(tmp_path))
+
+    with open(price_server.archive_file_path('p1', str(tmp_path)), encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [entry]
+
+
+def test_reposting_unchanged_price_keeps_buckets_and_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_server, 'DATA_DIR', str(tmp_path))
+    client = price_server.app.test_client()
+    entry = {'price': 1, 'date': history_date(datetime.now() - timedelta(days=60))}
+    payload = {'p1': {'name': 'Widget', 'price': 1, 'history': [entry]}}
+
+    for _ in range(3):
+        assert client.post('/prices', json=payload).status_code == 200
+
+    with open(tmp_path / 'product_prices.json', encoding='utf-8') as f:
+        history = json.load(f)['p1']['history']
+    assert [bucket['count'] for bucket in history] == [1]
+    assert client.get('/prices/p1/archive').get_json() == [entry]
+
+
+def test_product_named_flush_can_be_updated(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_server, 'DATA_DIR', str(tmp_path))
+    client = price_server.app.test_client()
+
+    response = client.post('/prices/flush?sync=true', json={'name': 'Flush valve', 'price': 5})
+    assert response.get_json()['queued'] is False
+    assert client.get('/prices').get_json()['flush']['price'] == 5
+
+    client.post('/prices/p1', json={'name': 'Widget', 'price': 1})
+    assert client.post('/price_queue/flush').get_json()['written'] == 1
+
+
+def test_unknown_tenant_is_rejected_without_creating_a_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_server, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(price_server, 'TENANTS_DIR', str(tmp_path / 'tenants'))
+    client = price_server.app.test_client()
+
+    assert client.get('/health', headers={'X-Tenant-ID': 'zzz'}).status_code == 404
+    assert client.post('/prices', headers={'X-Tenant-ID': 'zzz'},
+                       json={'p1': {'name': 'Widget', 'price': 1}}).status_code == 404
+    assert client.post('/t/zzz/backup').status_code == 404
+    assert not (tmp_path / 'tenants' / 'zzz').exists()
+
+    (tmp_path / 'tenants' / 'shop1').mkdir(parents=True)
+    assert client.post('/t/shop1/prices', json={'p1': {'name': 'Widget', 'price': 1}}).status_code == 200
+    assert client.get('/prices', headers={'X-Tenant-ID': 'shop1'}).get_json()['p1']['price'] == 1
+
+
+def test_same_size_rewrite_is_not_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_server, 'DATA_DIR', str(tmp_path))
+    client = price_server.app.test_client()
+    categories_path = str(tmp_path / 'categories.json')
+
+    client.post('/categories', json=[{'id': 'tools', 'name': 'Tools 10.5'}])
+    signature = os.stat(categories_path)
+    assert client.get('/categories').get_json()[0]['name'] == 'Tools 10.5'
+
+    client.post('/categories', json=[{'id': 'tools', 'name': 'Tools 11.5'}])
+    # Simulate a filesystem whose timestamps did not move between the writes
+    os.utime(categories_path, ns=(signature.st_atime_ns, signature.st_mtime_ns))
+    assert os.stat(categories_path).st_size == signature.st_size
+    assert client.get('/categories').get_json()[0]['name'] == 'Tools 11.5'